@@ -0,0 +1,178 @@
+// Copyright (c) Meta Platforms, Inc. and affiliates.
+//
+// This source code is licensed under the MIT license found in the
+// LICENSE file in the root directory of this source tree.
+
+// Native implementation of the IK iterations of PinocchioIKSolver.
+//
+// Runs the same damped least squares iterations as the Python implementation
+// (adaptive Levenberg-Marquardt damping + backtracking line search), but
+// without a round trip to Python for every pinocchio call. Pinocchio's Python
+// bindings cannot be shared with pybind11, so the solver loads its own copy of
+// the model from the URDF.
+
+#include <algorithm>
+#include <stdexcept>
+#include <string>
+#include <tuple>
+
+#include <Eigen/Cholesky>
+#include <Eigen/Core>
+
+#include <pinocchio/algorithm/frames.hpp>
+#include <pinocchio/algorithm/joint-configuration.hpp>
+#include <pinocchio/algorithm/kinematics.hpp>
+#include <pinocchio/parsers/urdf.hpp>
+
+#include <pybind11/eigen.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+namespace py = pybind11;
+
+using Vector6d = Eigen::Matrix<double, 6, 1>;
+using Matrix6d = Eigen::Matrix<double, 6, 6>;
+
+class IKSolver {
+public:
+  IKSolver(const std::string &urdf_path, const std::string &ee_link_name,
+           double eps, double damp, double damp_min, double damp_max,
+           double damp_decrease, double damp_increase,
+           int max_line_search_steps, int max_stalled_steps, double grad_tol,
+           double rel_cost_tol)
+      : eps_(eps), damp_(damp), damp_min_(damp_min), damp_max_(damp_max),
+        damp_decrease_(damp_decrease), damp_increase_(damp_increase),
+        max_line_search_steps_(max_line_search_steps),
+        max_stalled_steps_(max_stalled_steps), grad_tol_(grad_tol),
+        rel_cost_tol_(rel_cost_tol) {
+    pinocchio::urdf::buildModel(urdf_path, model_);
+    data_ = pinocchio::Data(model_);
+    // Resolve the frame in this model rather than taking an index from the
+    // Python model, which may come from a different pinocchio build
+    if (!model_.existFrame(ee_link_name)) {
+      throw std::invalid_argument("Unknown end-effector link: " + ee_link_name);
+    }
+    ee_frame_idx_ = model_.getFrameId(ee_link_name);
+  }
+
+  // Returns the model configuration, success flag, number of iterations and
+  // final 6D log error, like the Python loop of PinocchioIKSolver.
+  std::tuple<Eigen::VectorXd, bool, int, Vector6d>
+  solve(Eigen::VectorXd q, const Eigen::Vector3d &pos_desired,
+        const Eigen::Matrix3d &rot_desired, int max_iterations) {
+    const pinocchio::SE3 desired_ee_pose(rot_desired, pos_desired);
+
+    pinocchio::Data::Matrix6x J(6, model_.nv);
+    J.setZero();
+    Eigen::VectorXd v(model_.nv);
+    Eigen::VectorXd q_new(model_.nq);
+    Vector6d err_new;
+    Matrix6d A;
+
+    Vector6d err = computeEEError(q, desired_ee_pose);
+    double err_norm = err.norm();
+    double lam = damp_;
+    int num_stalled = 0;
+    bool success = false;
+    int i = 0;
+
+    while (true) {
+      if (err_norm < eps_) {
+        success = true;
+        break;
+      }
+      if (i >= max_iterations) {
+        break;
+      }
+      pinocchio::computeFrameJacobian(model_, data_, q, ee_frame_idx_,
+                                      pinocchio::LOCAL, J);
+      if ((J.transpose() * err).cwiseAbs().maxCoeff() < grad_tol_) {
+        // Stationary point away from the target
+        break;
+      }
+
+      // Levenberg-Marquardt step; J J^T + lam * I is symmetric positive
+      // definite
+      A.noalias() = J * J.transpose();
+      A.diagonal().array() += lam;
+      v.noalias() = -J.transpose() * A.llt().solve(err);
+
+      // Backtracking line search on the error norm
+      double alpha = 1.0;
+      double err_new_norm = 0.0;
+      bool accepted = false;
+      for (int k = 0; k <= max_line_search_steps_; ++k) {
+        pinocchio::integrate(model_, q, alpha * v, q_new);
+        err_new = computeEEError(q_new, desired_ee_pose);
+        err_new_norm = err_new.norm();
+        if (err_new_norm < err_norm) {
+          accepted = true;
+          break;
+        }
+        alpha *= 0.5;
+      }
+      ++i;
+
+      if (accepted) {
+        lam = std::max(lam * damp_decrease_, damp_min_);
+        const double rel_cost_change = (err_norm - err_new_norm) / err_norm;
+        q = q_new;
+        err = err_new;
+        err_norm = err_new_norm;
+        num_stalled = rel_cost_change < rel_cost_tol_ ? num_stalled + 1 : 0;
+      } else {
+        lam = std::min(lam * damp_increase_, damp_max_);
+        ++num_stalled;
+      }
+
+      // Near a least-squares minimum of the error, steps are rejected or
+      // barely help
+      if (err_norm >= eps_ &&
+          (num_stalled >= max_stalled_steps_ || lam >= damp_max_)) {
+        break;
+      }
+    }
+
+    return std::make_tuple(q, success, i, err);
+  }
+
+private:
+  Vector6d computeEEError(const Eigen::VectorXd &q,
+                          const pinocchio::SE3 &desired_ee_pose) {
+    pinocchio::forwardKinematics(model_, data_, q);
+    pinocchio::updateFramePlacement(model_, data_, ee_frame_idx_);
+    return pinocchio::log6(desired_ee_pose.actInv(data_.oMf[ee_frame_idx_]))
+        .toVector();
+  }
+
+  pinocchio::Model model_;
+  pinocchio::Data data_;
+  pinocchio::FrameIndex ee_frame_idx_;
+
+  double eps_;
+  double damp_;
+  double damp_min_;
+  double damp_max_;
+  double damp_decrease_;
+  double damp_increase_;
+  int max_line_search_steps_;
+  int max_stalled_steps_;
+  double grad_tol_;
+  double rel_cost_tol_;
+};
+
+PYBIND11_MODULE(_pinocchio_ik, m) {
+  m.doc() = "Native IK iterations for home_robot.motion.pinocchio_ik_solver";
+
+  py::class_<IKSolver>(m, "IKSolver")
+      .def(py::init<const std::string &, const std::string &, double, double,
+                    double, double, double, double, int, int, double, double>(),
+           py::arg("urdf_path"), py::arg("ee_link_name"), py::arg("eps"),
+           py::arg("damp"), py::arg("damp_min"), py::arg("damp_max"),
+           py::arg("damp_decrease"), py::arg("damp_increase"),
+           py::arg("max_line_search_steps"), py::arg("max_stalled_steps"),
+           py::arg("grad_tol"), py::arg("rel_cost_tol"))
+      .def("solve", &IKSolver::solve, py::arg("q"), py::arg("pos_desired"),
+           py::arg("rot_desired"), py::arg("max_iterations"),
+           py::call_guard<py::gil_scoped_release>());
+}
@@ -37,3 +37,21 @@ class IKSolverBase(object):
         method-specific way) how well a fit was found.
         """
         raise NotImplementedError()
+
+    def compute_ik_and_pose(
+        self,
+        pos_desired: np.ndarray,
+        quat_desired: np.ndarray,
+        *args,
+        **kwargs,
+    ) -> Tuple[np.ndarray, bool, dict, np.ndarray, np.ndarray]:
+        """
+        Same as compute_ik, but additionally returns the end-effector position and quaternion achieved by the
+        resulting joint states. Solvers that already know the final pose from their last iteration can override
+        this to avoid the extra forward kinematics call.
+        """
+        q, success, debug_info = self.compute_ik(
+            pos_desired, quat_desired, *args, **kwargs
+        )
+        pos, quat = self.compute_fk(q)
+        return q, success, debug_info, pos, quat
@@ -2,15 +2,26 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pinocchio
+import scipy.linalg
 from scipy.spatial.transform import Rotation as R
 
 from home_robot.motion.ik_solver_base import IKSolverBase
 from home_robot.utils.bullet import PybulletIKSolver
 
+try:
+    from home_robot.motion import _pinocchio_ik
+except ImportError:
+    # C++ extension not built; fall back to the Python IK iterations
+    _pinocchio_ik = None
+
 # --DEFAULTS--
 # Error tolerances
 POS_ERROR_TOL = 0.005
@@ -25,16 +36,34 @@ CEM_NUM_TOP = 10
 class PinocchioIKSolver(IKSolverBase):
     """IK solver using pinocchio which can handle end-effector constraints for optimized IK solutions"""
 
-    EPS = 1e-4
-    DT = 1e-1
-    DAMP = 1e-12
+    EPS = 1e-4  # Convergence threshold on the norm of the pose error
+    DAMP = 1e-6  # Initial Levenberg-Marquardt damping
+    DAMP_MIN = 1e-12
+    DAMP_MAX = 1e6
+    DAMP_DECREASE = 0.7  # Damping multiplier after an accepted step
+    DAMP_INCREASE = 2.0  # Damping multiplier after a rejected step
+    MAX_LINE_SEARCH_STEPS = 5  # Max number of step halvings per iteration
+    MAX_STALLED_STEPS = 2  # Max consecutive iterations without sufficient decrease
+    GRAD_TOL = 1e-8  # Stationarity threshold on ||J^T err||_inf
+    REL_COST_TOL = 1e-4  # Min relative decrease of the error norm per iteration
 
-    def __init__(self, urdf_path: str, ee_link_name: str, controlled_joints: List[str]):
+    def __init__(
+        self,
+        urdf_path: str,
+        ee_link_name: str,
+        controlled_joints: List[str],
+        use_native: bool = True,
+    ):
         """
         urdf_path: path to urdf file
         ee_link_name: name of the end-effector link
         controlled_joints: list of joint names to control
+        use_native: run the IK iterations in the C++ extension, if it was built
         """
+        self.urdf_path = urdf_path
+        self.ee_link_name = ee_link_name
+        self.controlled_joint_names = controlled_joints
+
         self.model = pinocchio.buildModelFromUrdf(urdf_path)
         self.data = self.model.createData()
         self.q_neutral = pinocchio.neutral(self.model)
@@ -45,6 +74,64 @@ class PinocchioIKSolver(IKSolverBase):
             for j in controlled_joints
         ]
 
+        # Index arrays mapping control joints to model joints; "ignore" joints are masked out
+        ctrl_idx = np.array(self.controlled_joints, dtype=np.int64)
+        ctrl_pos = np.flatnonzero(ctrl_idx >= 0)
+        ctrl_idx = ctrl_idx[ctrl_pos]
+        self._ctrl_pos: Union[np.ndarray, slice] = ctrl_pos
+        self._ctrl_idx: Union[np.ndarray, slice] = ctrl_idx
+        # The joint list is fixed from here on; if it maps a contiguous block of control joints to
+        # a contiguous block of model joints, specialize the maps to basic slicing
+        if (
+            len(ctrl_pos) > 0
+            and np.all(np.diff(ctrl_pos) == 1)
+            and np.all(np.diff(ctrl_idx) == 1)
+        ):
+            self._ctrl_pos = slice(int(ctrl_pos[0]), int(ctrl_pos[-1]) + 1)
+            self._ctrl_idx = slice(int(ctrl_idx[0]), int(ctrl_idx[-1]) + 1)
+
+        # The end-effector pose can be recovered from the final IK error only if the control joints
+        # include every joint moving the end-effector; IK moves all model joints, but uncontrolled
+        # and "ignore" joints are reset to neutral in the returned configuration
+        ee_frame = self.model.frames[self.ee_frame_idx]
+        ee_joint_id = (
+            ee_frame.parentJoint
+            if hasattr(ee_frame, "parentJoint")
+            else ee_frame.parent
+        )
+        ee_chain_idx = [
+            idx_q
+            for joint_id in self.model.supports[ee_joint_id]
+            for idx_q in range(
+                self.model.idx_qs[joint_id],
+                self.model.idx_qs[joint_id] + self.model.nqs[joint_id],
+            )
+        ]
+        self._pose_from_ik_error = set(ee_chain_idx) <= set(ctrl_idx.tolist())
+
+        # Preallocated buffers for the IK iterations
+        self._A = np.empty((6, 6))
+        self._diag_idx = np.arange(6)
+        self._v = np.empty(self.model.nv)
+        self._dq = np.empty(self.model.nv)
+
+        self._native_ik_solver = None
+        if use_native and _pinocchio_ik is not None:
+            self._native_ik_solver = _pinocchio_ik.IKSolver(
+                urdf_path=urdf_path,
+                ee_link_name=ee_link_name,
+                eps=self.EPS,
+                damp=self.DAMP,
+                damp_min=self.DAMP_MIN,
+                damp_max=self.DAMP_MAX,
+                damp_decrease=self.DAMP_DECREASE,
+                damp_increase=self.DAMP_INCREASE,
+                max_line_search_steps=self.MAX_LINE_SEARCH_STEPS,
+                max_stalled_steps=self.MAX_STALLED_STEPS,
+                grad_tol=self.GRAD_TOL,
+                rel_cost_tol=self.REL_COST_TOL,
+            )
+
     def get_dof(self) -> int:
         """returns dof for the manipulation chain"""
         return len(self.controlled_joints)
@@ -56,17 +143,14 @@ class PinocchioIKSolver(IKSolverBase):
     def _qmap_control2model(self, q_input: np.ndarray) -> np.ndarray:
         """returns a full joint configuration from a partial joint configuration"""
         q_out = self.q_neutral.copy()
-        for i, joint_idx in enumerate(self.controlled_joints):
-            q_out[joint_idx] = q_input[i]
+        q_out[self._ctrl_idx] = np.asarray(q_input)[self._ctrl_pos]
 
         return q_out
 
     def _qmap_model2control(self, q_input: np.ndarray) -> np.ndarray:
         """returns a partial joint configuration from a full joint configuration"""
         q_out = np.empty(len(self.controlled_joints))
-        for i, joint_idx in enumerate(self.controlled_joints):
-            if joint_idx >= 0:
-                q_out[i] = q_input[joint_idx]
+        q_out[self._ctrl_pos] = q_input[self._ctrl_idx]
 
         return q_out
 
@@ -75,10 +159,106 @@ class PinocchioIKSolver(IKSolverBase):
         q_model = self._qmap_control2model(q)
         pinocchio.forwardKinematics(self.model, self.data, q_model)
         pinocchio.updateFramePlacement(self.model, self.data, self.ee_frame_idx)
-        pos = self.data.oMf[self.ee_frame_idx].translation
-        quat = R.from_matrix(self.data.oMf[self.ee_frame_idx].rotation).as_quat()
+        ee_pose = self.data.oMf[self.ee_frame_idx]
+        # coeffs() is already in (x, y, z, w) order
+        quat = pinocchio.Quaternion(ee_pose.rotation).coeffs()
 
-        return pos.copy(), quat.copy()
+        return ee_pose.translation.copy(), quat.copy()
+
+    def _compute_ee_error(
+        self, q: np.ndarray, desired_ee_pose: pinocchio.SE3
+    ) -> np.ndarray:
+        """returns the 6D log error between the end-effector pose at model configuration q and the desired pose"""
+        pinocchio.forwardKinematics(self.model, self.data, q)
+        pinocchio.updateFramePlacement(self.model, self.data, self.ee_frame_idx)
+        dMi = desired_ee_pose.actInv(self.data.oMf[self.ee_frame_idx])
+        return pinocchio.log(dMi).vector
+
+    def _ee_pose_from_error(
+        self, err: np.ndarray, desired_ee_pose: pinocchio.SE3
+    ) -> pinocchio.SE3:
+        """recovers the end-effector pose from its log error w.r.t. the desired pose, without running FK"""
+        return desired_ee_pose * pinocchio.exp6(err)
+
+    def _solve_ik_python(
+        self,
+        q: np.ndarray,
+        desired_ee_pose: pinocchio.SE3,
+        max_iterations: int,
+        verbose: bool = False,
+    ) -> Tuple[np.ndarray, bool, int, np.ndarray]:
+        """runs the IK iterations from model configuration q; returns the final configuration,
+        success flag, number of iterations and final error"""
+        i = 0
+        err = self._compute_ee_error(q, desired_ee_pose)
+        err_norm = np.linalg.norm(err)
+        lam = self.DAMP
+        num_stalled = 0
+        while True:
+            if verbose:
+                print(f"[pinocchio_ik_solver] iter={i}; error={err}; damping={lam}")
+            if err_norm < self.EPS:
+                success = True
+                break
+            if i >= max_iterations:
+                success = False
+                break
+            J = pinocchio.computeFrameJacobian(
+                self.model,
+                self.data,
+                q,
+                self.ee_frame_idx,
+                pinocchio.ReferenceFrame.LOCAL,
+            )
+            if np.max(np.abs(J.T @ err)) < self.GRAD_TOL:
+                # Stationary point away from the target: more iterations will not help
+                success = False
+                break
+
+            # Levenberg-Marquardt step; J J^T + lam * I is symmetric positive definite
+            np.dot(J, J.T, out=self._A)
+            self._A[self._diag_idx, self._diag_idx] += lam
+            c, low = scipy.linalg.cho_factor(
+                self._A, overwrite_a=True, check_finite=False
+            )
+            sol = scipy.linalg.cho_solve((c, low), err, check_finite=False)
+            np.dot(J.T, sol, out=self._v)
+            self._v *= -1.0
+
+            # Backtracking line search on the error norm
+            alpha = 1.0
+            accepted = False
+            for _ in range(self.MAX_LINE_SEARCH_STEPS + 1):
+                np.multiply(self._v, alpha, out=self._dq)
+                q_new = pinocchio.integrate(self.model, q, self._dq)
+                err_new = self._compute_ee_error(q_new, desired_ee_pose)
+                err_new_norm = np.linalg.norm(err_new)
+                if err_new_norm < err_norm:
+                    accepted = True
+                    break
+                alpha *= 0.5
+            i += 1
+
+            if accepted:
+                lam = max(lam * self.DAMP_DECREASE, self.DAMP_MIN)
+                rel_cost_change = (err_norm - err_new_norm) / err_norm
+                q, err, err_norm = q_new, err_new, err_new_norm
+                if rel_cost_change < self.REL_COST_TOL:
+                    num_stalled += 1
+                else:
+                    num_stalled = 0
+            else:
+                lam = min(lam * self.DAMP_INCREASE, self.DAMP_MAX)
+                num_stalled += 1
+
+            # Near a least-squares minimum of the error, steps are rejected or barely help
+            if err_norm >= self.EPS and (
+                num_stalled >= self.MAX_STALLED_STEPS or lam >= self.DAMP_MAX
+            ):
+                success = False
+                break
+
+        return q, success, i, err
 
     def compute_ik(
         self,
@@ -91,14 +271,36 @@ class PinocchioIKSolver(IKSolverBase):
     ) -> Tuple[np.ndarray, bool, dict]:
         """given end-effector position and quaternion, return joint values.
 
+        See compute_ik_and_pose for a description of the parameters.
+        """
+        q_control, success, debug_info, _, _ = self.compute_ik_and_pose(
+            pos_desired,
+            quat_desired,
+            q_init=q_init,
+            max_iterations=max_iterations,
+            num_attempts=num_attempts,
+            verbose=verbose,
+        )
+        return q_control, success, debug_info
+
+    def compute_ik_and_pose(
+        self,
+        pos_desired: np.ndarray,
+        quat_desired: np.ndarray,
+        q_init=None,
+        max_iterations=100,
+        num_attempts: int = 1,
+        verbose: bool = False,
+    ) -> Tuple[np.ndarray, bool, dict, np.ndarray, np.ndarray]:
+        """given end-effector position and quaternion, return joint values along with the
+        end-effector position and quaternion they achieve.
+
         Two parameters are currently unused and might be implemented in the future:
             q_init: initial configuration for the optimization to start in; especially useful for
                     arms with redundant degrees of freedom
             num_attempts: start from multiple initial configs; included for compatibility with pb
             max iterations: time budget in number of steps; included for compatibility with pb
         """
-        i = 0
-
         if q_init is None:
             q = self.q_neutral.copy()
             if num_attempts > 1:
@@ -110,38 +312,90 @@ class PinocchioIKSolver(IKSolverBase):
             # Override the number of attempts
             num_attempts = 1
 
+        x, y, z, w = quat_desired
         desired_ee_pose = pinocchio.SE3(
-            R.from_quat(quat_desired).as_matrix(), pos_desired
+            pinocchio.Quaternion(w, x, y, z).normalized().toRotationMatrix(),
+            np.asarray(pos_desired, dtype=np.float64),
         )
-        while True:
-            pinocchio.forwardKinematics(self.model, self.data, q)
-            pinocchio.updateFramePlacement(self.model, self.data, self.ee_frame_idx)
-
-            dMi = desired_ee_pose.actInv(self.data.oMf[self.ee_frame_idx])
-            err = pinocchio.log(dMi).vector
-            if verbose:
-                print(f"[pinocchio_ik_solver] iter={i}; error={err}")
-            if np.linalg.norm(err) < self.EPS:
-                success = True
-                break
-            if i >= max_iterations:
-                success = False
-                break
-            J = pinocchio.computeFrameJacobian(
-                self.model,
-                self.data,
+        if self._native_ik_solver is not None and not verbose:
+            q, success, i, err = self._native_ik_solver.solve(
                 q,
-                self.ee_frame_idx,
-                pinocchio.ReferenceFrame.LOCAL,
+                desired_ee_pose.translation,
+                desired_ee_pose.rotation,
+                max_iterations,
+            )
+        else:
+            q, success, i, err = self._solve_ik_python(
+                q, desired_ee_pose, max_iterations, verbose
             )
-            v = -J.T.dot(np.linalg.solve(J.dot(J.T) + self.DAMP * np.eye(6), err))
-            q = pinocchio.integrate(self.model, q, v * self.DT)
-            i += 1
 
         q_control = self._qmap_model2control(q.flatten())
         debug_info = {"iter": i, "final_error": err}
+        if self._pose_from_ik_error:
+            ee_pose = self._ee_pose_from_error(err, desired_ee_pose)
+            pos_out = ee_pose.translation.copy()
+            quat_out = pinocchio.Quaternion(ee_pose.rotation).coeffs().copy()
+        else:
+            pos_out, quat_out = self.compute_fk(q_control)
 
-        return q_control, success, debug_info
+        return q_control, success, debug_info, pos_out, quat_out
+
+
+# IK solver owned by each CEM worker process, since pinocchio models and data cannot be pickled
+_worker_ik_solver: Optional[PinocchioIKSolver] = None
+
+
+def _init_worker_ik_solver(
+    urdf_path: str, ee_link_name: str, controlled_joints: List[str]
+):
+    """process pool initializer building the IK solver of a worker process"""
+    global _worker_ik_solver
+    _worker_ik_solver = PinocchioIKSolver(urdf_path, ee_link_name, controlled_joints)
+
+
+def _compute_ik_cost(
+    ik_solver: IKSolverBase,
+    pos_desired: np.ndarray,
+    quat_desired: np.ndarray,
+    pos_wt: float,
+    ori_wt: float,
+    q_init: Optional[np.ndarray],
+    dr: np.ndarray,
+) -> Tuple[float, np.ndarray, bool]:
+    """IK error given delta dr from the desired orientation; returns the cost, the IK solution and
+    whether the IK subsolver succeeded"""
+    pos = pos_desired
+    quat = (R.from_rotvec(dr) * R.from_quat(quat_desired)).as_quat()
+
+    (
+        q,
+        success,
+        subsolver_debug_info,
+        pos_out,
+        rot_out,
+    ) = ik_solver.compute_ik_and_pose(pos, quat, q_init=q_init)
+
+    cost_pos = np.linalg.norm(pos - pos_out)
+    cost_rot = 1 - (rot_out * quat_desired).sum() ** 2  # TODO: just minimize dr?
+
+    cost = pos_wt * cost_pos + ori_wt * cost_rot
+
+    return cost, q, success
+
+
+def _compute_ik_cost_in_worker(
+    pos_desired: np.ndarray,
+    quat_desired: np.ndarray,
+    pos_wt: float,
+    ori_wt: float,
+    q_init: Optional[np.ndarray],
+    dr: np.ndarray,
+) -> Tuple[float, np.ndarray]:
+    """_compute_ik_cost using the IK solver of the current worker process"""
+    cost, q, _ = _compute_ik_cost(
+        _worker_ik_solver, pos_desired, quat_desired, pos_wt, ori_wt, q_init, dr
+    )
+    return cost, q
 
 
 class PositionIKOptimizer(IKSolverBase):
@@ -169,6 +423,7 @@ class PositionIKOptimizer(IKSolverBase):
 
         # Initialize IK solver
         self.ik_solver = ik_solver
+        self._last_q: Optional[np.ndarray] = None  # Warm start for IK subproblems
 
         # Initialize optimizer
         self.pos_error_tol = pos_error_tol
@@ -189,6 +444,25 @@ class PositionIKOptimizer(IKSolverBase):
             else self.num_samples
         )
         num_top = cem_params["num_top"] if "num_top" in cem_params else self.num_top
+        n_jobs = cem_params["n_jobs"] if "n_jobs" in cem_params else 1
+        seed = cem_params["seed"] if "seed" in cem_params else None
+        rel_tol = cem_params["rel_tol"] if "rel_tol" in cem_params else 1e-3
+        patience = cem_params["patience"] if "patience" in cem_params else 2
+
+        # Parallel CEM rebuilds the IK solver in every worker process
+        worker_initializer = None
+        worker_initargs = ()
+        if n_jobs != 1:
+            if not isinstance(self.ik_solver, PinocchioIKSolver):
+                raise NotImplementedError(
+                    "Parallel CEM is only supported with the Pinocchio solver."
+                )
+            worker_initializer = _init_worker_ik_solver
+            worker_initargs = (
+                self.ik_solver.urdf_path,
+                self.ik_solver.ee_link_name,
+                self.ik_solver.controlled_joint_names,
+            )
 
         self.opt = CEM(
             max_iterations=max_iterations,
@@ -196,6 +470,12 @@ class PositionIKOptimizer(IKSolverBase):
             num_top=num_top,
             tol=self.pos_error_tol,
             sigma0=self.ori_error_range / 2,
+            rel_tol=rel_tol,
+            patience=patience,
+            n_jobs=n_jobs,
+            worker_initializer=worker_initializer,
+            worker_initargs=worker_initargs,
+            seed=seed,
         )
 
     def get_dof(self) -> int:
@@ -213,27 +493,55 @@ class PositionIKOptimizer(IKSolverBase):
     ) -> Tuple[np.ndarray, bool, dict]:
         """optimization-based IK solver using CEM"""
 
+        # Solve IK for the desired orientation itself; its solution seeds the CEM samples, which
+        # are small perturbations of this orientation. Pybullet is not warm-started, since an
+        # initial configuration disables its random restarts.
+        warm_start = isinstance(self.ik_solver, PinocchioIKSolver)
+        self._last_q = None
+        if warm_start:
+            q, success, _ = self.ik_solver.compute_ik(pos_desired, quat_desired)
+            if success:
+                self._last_q = q
+
         # Function to optimize: IK error given delta from original desired orientation
         def solve_ik(dr):
-            pos = pos_desired
-            quat = (R.from_rotvec(dr) * R.from_quat(quat_desired)).as_quat()
-
-            q, _, subsolver_debug_info = self.ik_solver.compute_ik(pos, quat)
-            pos_out, rot_out = self.ik_solver.compute_fk(q)
-
-            cost_pos = np.linalg.norm(pos - pos_out)
-            cost_rot = (
-                1 - (rot_out * quat_desired).sum() ** 2
-            )  # TODO: just minimize dr?
-
-            cost = self.pos_wt * cost_pos + self.ori_wt * cost_rot
+            cost, q, success = _compute_ik_cost(
+                self.ik_solver,
+                pos_desired,
+                quat_desired,
+                self.pos_wt,
+                self.ori_wt,
+                self._last_q,
+                dr,
+            )
+            if warm_start and success:
+                self._last_q = q
 
             return cost, q
 
         # Optimize for IK and best orientation (x=0 -> use original desired orientation)
-        cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
-            solve_ik, x0=np.zeros(3)
-        )
+        if self.opt.n_jobs != 1:
+            # Worker processes evaluate samples with their own copy of the IK solver
+            solve_ik_in_worker = partial(
+                _compute_ik_cost_in_worker,
+                pos_desired,
+                quat_desired,
+                self.pos_wt,
+                self.ori_wt,
+                self._last_q,
+            )
+            cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
+                solve_ik_in_worker, x0=np.zeros(3)
+            )
+        else:
+            # Pinocchio always returns a joint configuration, which can be stored in an array;
+            # pybullet may return None
+            aux_shape = None
+            if isinstance(self.ik_solver, PinocchioIKSolver):
+                aux_shape = (self.get_dof(),)
+            cost_opt, q_result, max_iter, opt_sigma, success = self.opt.optimize(
+                solve_ik, x0=np.zeros(3), aux_shape=aux_shape
+            )
         pos_out, quat_out = self.ik_solver.compute_fk(q_result)
         print(
             f"After ik optimization, cost: {cost_opt}, result: {pos_out, quat_out} vs desired: {pos_desired, quat_desired}"
@@ -250,6 +558,10 @@ class PositionIKOptimizer(IKSolverBase):
     def compute_fk(self, q):
         return self.ik_solver.compute_fk(q)
 
+    def close(self):
+        """shuts down the worker processes of parallel CEM, if any were started"""
+        self.opt.close()
+
 
 class CEM:
     """class implementing generic CEM solver for optimization"""
@@ -261,42 +573,129 @@ class CEM:
         num_top: int,
         tol: float,
         sigma0: np.ndarray,
+        rel_tol: float = 1e-3,
+        patience: int = 2,
+        n_jobs: int = 1,
+        worker_initializer: Optional[Callable] = None,
+        worker_initargs: Tuple = (),
+        seed: Optional[int] = None,
     ):
         """
         max_iterations: max number of iterations
         num_samples: number of samples per iteration
         num_top: number of top samples to use for next iteration
         tol: tolerance for stopping criterion
+        rel_tol: min relative decrease of the best cost per iteration to not count as a plateau
+        patience: number of consecutive plateau iterations after which the optimization stops
+        n_jobs: number of worker processes evaluating samples in parallel (-1 to use all cores)
+        worker_initializer: called with worker_initargs once in every worker process on startup
+        seed: seed of the random number generator used for sampling; if None, every call to
+              optimize seeds it from numpy's global random state, so np.random.seed applies
         """
         self.max_iterations = max_iterations
         self.num_samples = num_samples
         self.num_top = num_top
         self.cost_tol = tol
         self.sigma0 = sigma0
+        self.rel_tol = rel_tol
+        self.patience = patience
+
+        # Samples are drawn in place into a preallocated buffer
+        self._rng = None if seed is None else np.random.default_rng(seed)
+        self._x_arr = np.empty((num_samples,) + sigma0.shape)
+
+        if n_jobs == 0 or n_jobs < -1:
+            raise ValueError(f"n_jobs must be positive or -1, got {n_jobs}")
+        self.n_jobs = n_jobs
+        self.worker_initializer = worker_initializer
+        self.worker_initargs = worker_initargs
+        self._num_workers = os.cpu_count() if n_jobs < 0 else n_jobs
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """returns the worker pool, starting it on first use so workers persist across calls"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._num_workers,
+                initializer=self.worker_initializer,
+                initargs=self.worker_initargs,
+            )
+        return self._executor
+
+    def close(self):
+        """shuts down the worker processes, if any were started"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def optimize(
+        self,
+        func: Callable,
+        x0: np.ndarray,
+        aux_shape: Optional[Tuple[int, ...]] = None,
+        aux_dtype: np.dtype = np.float64,
+    ):
+        """optimize function func with initial guess mu=x0 and initial std=sigma0
 
-    def optimize(self, func: Callable, x0: np.ndarray):
-        """optimize function func with initial guess mu=x0 and initial std=sigma0"""
+        func maps a sample x to a tuple (cost, aux_output). If n_jobs != 1, samples are evaluated in
+        worker processes, so func must be picklable (e.g. a module-level function or a
+        functools.partial of one).
+
+        If the aux outputs are arrays of a fixed aux_shape and aux_dtype, samples evaluated serially
+        write them into a (num_samples, *aux_shape) array allocated once per call instead of
+        collecting them in a new list every iteration.
+        """
         assert (
             x0.shape == self.sigma0.shape
         ), f"x0 and sigma0 must have same shape, got {x0.shape} and {self.sigma0.shape}"
 
+        rng = self._rng
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(2**32, dtype=np.int64))
+
         i = 0
         mu = x0
         sigma = self.sigma0
+        best_prev = np.inf
+        num_plateau = 0
+
+        aux_arr = None
+        if aux_shape is not None and self.n_jobs == 1:
+            aux_arr = np.empty((self.num_samples,) + tuple(aux_shape), dtype=aux_dtype)
 
         while True:
             # Sample x
-            x_arr = mu + sigma * np.random.randn(self.num_samples, x0.shape[0])
+            x_arr = self._x_arr
+            rng.standard_normal(out=x_arr)
+            np.multiply(x_arr, sigma, out=x_arr)
+            x_arr += mu
 
             # Compute costs
-            cost_arr = np.zeros(self.num_samples)
-            aux_outputs = [None for _ in range(self.num_samples)]
-            for j, x in enumerate(x_arr):
-                cost_arr[j], aux_outputs[j] = func(x)
-
-            # Sort costs
-            idx_sorted_arr = np.argsort(cost_arr)
-            i_best = idx_sorted_arr[0]
+            if self.n_jobs != 1:
+                chunksize = math.ceil(self.num_samples / self._num_workers)
+                results = list(
+                    self._get_executor().map(func, x_arr, chunksize=chunksize)
+                )
+                cost_arr = np.array([cost for cost, _ in results])
+                aux_outputs = [aux for _, aux in results]
+            else:
+                cost_arr = np.zeros(self.num_samples)
+                if aux_arr is None:
+                    aux_outputs = [None for _ in range(self.num_samples)]
+                else:
+                    aux_outputs = aux_arr
+                for j, x in enumerate(x_arr):
+                    cost_arr[j], aux_outputs[j] = func(x)
+
+            # Select top candidates; only the best one needs to be found exactly
+            idx_top_arr = np.argpartition(cost_arr, self.num_top - 1)[: self.num_top]
+            i_best = idx_top_arr[np.argmin(cost_arr[idx_top_arr])]
 
             # Check termination
             i += 1
@@ -310,8 +709,25 @@ class CEM:
                 success = True
                 break
 
-            # Update distribution
-            mu = np.mean(x_arr[idx_sorted_arr[: self.num_top], :], axis=0)
-            sigma = np.std(x_arr[idx_sorted_arr[: self.num_top], :], axis=0)
-
-        return cost_arr[i_best], aux_outputs[i_best], i, sigma, success
+            # Stop early if the best cost has not improved for a few iterations
+            if best_prev - cost_arr[i_best] < self.rel_tol * abs(best_prev):
+                num_plateau += 1
+                if num_plateau >= self.patience:
+                    success = False
+                    break
+            else:
+                num_plateau = 0
+            best_prev = cost_arr[i_best]
+
+            # Update distribution from the top candidates only; they change every iteration, so
+            # there are no running statistics to update
+            x_top_arr = x_arr[idx_top_arr]
+            mu = np.mean(x_top_arr, axis=0)
+            sigma = np.std(x_top_arr, axis=0)
+
+        aux_best = aux_outputs[i_best]
+        if aux_arr is not None:
+            # Do not return a view that keeps the whole aux array alive
+            aux_best = aux_best.copy()
+
+        return cost_arr[i_best], aux_best, i, sigma, success
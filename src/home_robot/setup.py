@@ -2,11 +2,17 @@
 #
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
+import os
+import subprocess
+import sys
+import sysconfig
+
 from setuptools import find_packages, setup
 
 install_requires = [
     "numpy<1.24",
     "scipy",
+    "numba",
     "hydra-core",
     "yacs",
     "h5py",
@@ -19,10 +25,68 @@ install_requires = [
     "pin==2.6.17",
 ]
 
+
+def find_cmeel_pkg_config_dirs():
+    """pkg-config directories of pinocchio and its dependencies installed from pip (cmeel wheels)"""
+    site_dirs = sys.path + [
+        sysconfig.get_path("purelib"),
+        sysconfig.get_path("platlib"),
+    ]
+    pkg_config_dirs = []
+    for site_dir in dict.fromkeys(site_dirs):
+        for subdir in ["lib/pkgconfig", "share/pkgconfig"]:
+            pkg_config_dir = os.path.join(site_dir, "cmeel.prefix", subdir)
+            if os.path.isdir(pkg_config_dir):
+                pkg_config_dirs.append(pkg_config_dir)
+    return pkg_config_dirs
+
+
+def get_ext_modules():
+    """Optional C++ extension running the pinocchio IK iterations natively.
+
+    Only built if the HOME_ROBOT_BUILD_NATIVE_IK environment variable is set to 1; the pure Python
+    implementation is used otherwise. Needs pybind11, pkg-config and pinocchio with its
+    development files, either from conda-forge or from the pin[build] pip package.
+    """
+    if os.environ.get("HOME_ROBOT_BUILD_NATIVE_IK") != "1":
+        return []
+
+    from pybind11.setup_helpers import Pybind11Extension
+
+    env = os.environ.copy()
+    env["PKG_CONFIG_PATH"] = os.pathsep.join(
+        [env.get("PKG_CONFIG_PATH", "")] + find_cmeel_pkg_config_dirs()
+    ).strip(os.pathsep)
+    try:
+        cflags = subprocess.check_output(
+            ["pkg-config", "--cflags", "pinocchio"], env=env, text=True
+        ).split()
+        libs = subprocess.check_output(
+            ["pkg-config", "--libs", "pinocchio"], env=env, text=True
+        ).split()
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise RuntimeError(
+            f"pinocchio not found by pkg-config ({e}); needed by HOME_ROBOT_BUILD_NATIVE_IK=1"
+        ) from e
+
+    # Find the pinocchio libraries at runtime without LD_LIBRARY_PATH
+    rpaths = [f"-Wl,-rpath,{flag[2:]}" for flag in libs if flag.startswith("-L")]
+
+    return [
+        Pybind11Extension(
+            "home_robot.motion._pinocchio_ik",
+            ["home_robot/motion/cpp/pinocchio_ik.cpp"],
+            extra_compile_args=cflags,
+            extra_link_args=libs + rpaths,
+        )
+    ]
+
+
 setup(
     name="home-robot",
     version="0.1.0",
     packages=find_packages(where="."),
     install_requires=install_requires,
+    ext_modules=get_ext_modules(),
     include_package_data=True,
 )
@@ -5,6 +5,10 @@ import numpy as np
 import pytest
 from utils import generate_controller_input, get_controller_output
 
+from home_robot.control.feedback.velocity_controllers import (
+    SMALL_HEADING_ANG,
+    _turn_rate_limit,
+)
 from home_robot.control.goto_controller import GotoVelocityController
 
 NUM_ENTRIES = 10
@@ -46,3 +50,17 @@ def test_controller_input_output(controller, dataset):
     for x, y_ref in dataset:
         y = get_controller_output(controller, x)
         assert np.allclose(y, y_ref)
+
+
+@pytest.mark.parametrize(
+    "heading_diff", np.linspace(0.0, SMALL_HEADING_ANG, 11, endpoint=False)
+)
+def test_turn_rate_limit_small_heading(heading_diff):
+    lin_err, w_max = 1.0, 1.0
+    v_limit = _turn_rate_limit(lin_err, heading_diff, w_max, np.pi / 2)
+    v_limit_ref = (
+        w_max
+        * lin_err
+        / (np.sin(heading_diff) + heading_diff * np.cos(heading_diff) + 1e-5)
+    )
+    assert abs(v_limit - v_limit_ref) < 1e-6 * v_limit_ref
@@ -0,0 +1,68 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+#
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+import numpy as np
+import pytest
+
+from home_robot.motion.pinocchio_ik_solver import CEM
+
+X_OPT = np.array([1.0, -0.5, 0.25])
+
+
+def quadratic(x, offset=0.0):
+    """returns the cost and the sample itself as aux output"""
+    return float(np.sum((x - X_OPT) ** 2)) + offset, x.copy()
+
+
+def make_cem(tol, **kwargs):
+    return CEM(
+        max_iterations=100,
+        num_samples=50,
+        num_top=10,
+        tol=tol,
+        sigma0=np.ones(3),
+        seed=0,
+        **kwargs,
+    )
+
+
+def test_cem_converges():
+    cost, x, num_iters, sigma, success = make_cem(tol=1e-4).optimize(
+        quadratic, x0=np.zeros(3)
+    )
+    assert success
+    assert cost <= 1e-4
+    assert num_iters < 100
+    # The returned aux output belongs to the returned best cost
+    assert cost == pytest.approx(quadratic(x)[0])
+
+
+@pytest.mark.parametrize("offset", [1.0, -1.0])
+def test_cem_stops_on_plateau(offset):
+    # The minimum cost (offset) never reaches the tolerance, so CEM can only stop by itself once the
+    # best cost stops improving
+    tol = offset - 0.5
+    cost, x, num_iters, sigma, success = make_cem(tol=tol, rel_tol=1e-3).optimize(
+        lambda x: quadratic(x, offset), x0=np.zeros(3)
+    )
+    assert not success
+    assert num_iters < 100
+    assert cost == pytest.approx(offset, abs=1e-2)
+    assert cost == pytest.approx(quadratic(x, offset)[0])
+
+
+def test_cem_aux_array():
+    cost1, x1, iters1, _, _ = make_cem(tol=1e-4).optimize(quadratic, x0=np.zeros(3))
+    cost2, x2, iters2, _, _ = make_cem(tol=1e-4).optimize(
+        quadratic, x0=np.zeros(3), aux_shape=(3,)
+    )
+    assert cost1 == cost2
+    assert np.array_equal(x1, x2)
+    assert iters1 == iters2
+    assert x2.base is None
+
+
+def test_cem_invalid_n_jobs():
+    with pytest.raises(ValueError):
+        make_cem(tol=1e-4, n_jobs=0)
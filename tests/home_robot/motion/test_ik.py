@@ -8,8 +8,14 @@ import numpy as np
 import pytest
 from scipy.spatial.transform import Rotation as R
 
-from home_robot.motion.pinocchio_ik_solver import PositionIKOptimizer
+from home_robot.motion.pinocchio_ik_solver import (
+    PinocchioIKSolver,
+    PositionIKOptimizer,
+    _pinocchio_ik,
+)
 from home_robot.motion.stretch import (
+    PIN_CONTROLLED_JOINTS,
+    STRETCH_GRASP_FRAME,
     STRETCH_GRASP_OFFSET,
     STRETCH_HOME_Q,
     HelloStretchKinematics,
@@ -21,6 +27,7 @@ from home_robot.utils.pose import to_matrix, to_pos_quat
 # Hyperparams
 DEBUG = False
 URDF_ABS_PATH = os.path.join(REPO_ROOT_PATH, "assets/hab_stretch/urdf/")
+PLANNER_URDF_PATH = os.path.join(REPO_ROOT_PATH, "assets/planner.urdf")
 
 POS_ERROR_TOL = 1.5e-4  # 0.1 mm
 ORI_ERROR_TOL = 1e-6  # 0.1 degrees in quat distance
@@ -307,6 +314,30 @@ def test_pinocchio_ik_optimization(pin_robot, pin_ik_optimizer, test_pose):
     )
     assert success
 
+    # CEM samples are warm-started from successful IK solutions
+    assert pin_ik_optimizer._last_q is not None
+
+
+def test_pinocchio_ik_optimization_parallel(pin_robot, test_pose):
+    pos_desired = np.array(test_pose[0])
+    quat_desired = np.array(test_pose[1])
+
+    # Evaluate CEM samples in worker processes
+    pin_ik_optimizer = PositionIKOptimizer(
+        pin_robot.manip_ik_solver,
+        pos_error_tol=CEM_POS_ERROR_TOL,
+        ori_error_range=np.array([0.0, 0.0, CEM_YAW_ERROR_TOL]),  # solve for yaw only
+        cem_params={"n_jobs": 2},
+    )
+    try:
+        q_result, success, _ = pin_ik_optimizer.compute_ik(pos_desired, quat_desired)
+    finally:
+        pin_ik_optimizer.close()
+
+    pos_out, _ = pin_robot.manip_ik_solver.compute_fk(q_result)
+    assert np.linalg.norm(pos_out - pos_desired) < CEM_POS_ERROR_TOL
+    assert success
+
 
 def test_pybullet_ik_optimization(pb_robot, pb_ik_optimizer, test_pose):
     np.random.seed(0)
@@ -341,6 +372,80 @@ def test_pybullet_ik_optimization(pb_robot, pb_ik_optimizer, test_pose):
     assert pos_err2 < pos_err1
     assert success
 
+    # Pybullet IK samples keep their random restarts instead of being warm-started
+    assert pb_ik_optimizer._last_q is None
+
+
+def test_pinocchio_ik_pose_matches_fk(pin_robot, test_pose):
+    pos_desired = np.array(test_pose[0])
+    quat_desired = np.array(test_pose[1])
+    solver = pin_robot.manip_ik_solver
+
+    # The pose returned along with the IK solution should be the FK of that solution, also for
+    # targets out of reach where the final IK error is large
+    for pos in [pos_desired, pos_desired + np.array([0.0, 0.0, 10.0])]:
+        q, _, _, pos_out, quat_out = solver.compute_ik_and_pose(pos, quat_desired)
+        pos_fk, quat_fk = solver.compute_fk(q)
+        assert compute_err(pos_out, pos_fk) < 1e-6
+        assert quaternion_distance(quat_out, quat_fk) < 1e-10
+
+
+@pytest.mark.parametrize(
+    "controlled_joints,pose_from_ik_error",
+    [
+        (PIN_CONTROLLED_JOINTS, False),
+        (["base_y_joint", "base_theta_joint"] + PIN_CONTROLLED_JOINTS, True),
+        (
+            ["ignore", "base_y_joint", "base_theta_joint"] + PIN_CONTROLLED_JOINTS[1:],
+            False,
+        ),
+    ],
+)
+def test_pinocchio_ik_pose_matches_fk_uncontrolled_joints(
+    controlled_joints, pose_from_ik_error
+):
+    solver = PinocchioIKSolver(
+        PLANNER_URDF_PATH, STRETCH_GRASP_FRAME, controlled_joints
+    )
+    assert solver._pose_from_ik_error == pose_from_ik_error
+
+    # IK also moves the base joints that are not controlled, which the returned configuration
+    # resets; the returned pose should still be the FK of that configuration
+    pos_desired = np.array([0.3, -0.6, 0.8])
+    quat_desired = np.array([0.0, 0.0, 0.0, 1.0])
+    q, _, _, pos_out, quat_out = solver.compute_ik_and_pose(pos_desired, quat_desired)
+    pos_fk, quat_fk = solver.compute_fk(q)
+    assert compute_err(pos_out, pos_fk) < 1e-6
+    assert quaternion_distance(quat_out, quat_fk) < 1e-10
+
+
+@pytest.mark.skipif(_pinocchio_ik is None, reason="native IK extension not built")
+def test_pinocchio_native_ik_matches_python(test_pose):
+    pos_desired = np.array(test_pose[0])
+    quat_desired = np.array(test_pose[1])
+    native_solver = PinocchioIKSolver(
+        PLANNER_URDF_PATH, STRETCH_GRASP_FRAME, PIN_CONTROLLED_JOINTS
+    )
+    python_solver = PinocchioIKSolver(
+        PLANNER_URDF_PATH,
+        STRETCH_GRASP_FRAME,
+        PIN_CONTROLLED_JOINTS,
+        use_native=False,
+    )
+    assert native_solver._native_ik_solver is not None
+
+    # Both implementations run the same iterations, also for targets out of reach
+    for pos in [pos_desired, pos_desired + np.array([0.0, 0.0, 10.0])]:
+        q_native, success_native, debug_native = native_solver.compute_ik(
+            pos, quat_desired
+        )
+        q_python, success_python, debug_python = python_solver.compute_ik(
+            pos, quat_desired
+        )
+        assert success_native == success_python
+        assert debug_native["iter"] == debug_python["iter"]
+        assert np.allclose(q_native, q_python, atol=1e-8)
+
 
 def test_ros_to_pin(pin_robot, test_joints):
     pin_pose = pin_robot._ros_pose_to_pinocchio(test_joints[0])